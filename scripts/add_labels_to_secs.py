@@ -1,8 +1,11 @@
 #!/usr/bin/env python3
 import re
 import unicodedata
+from functools import lru_cache
 from pathlib import Path
 
+from texio import iter_files, map_files, mapped
+
 ROOT = Path("./frontmatter")  # change if needed
 
 # Map LaTeX command -> label prefix
@@ -13,61 +16,67 @@ PREFIX = {
     "subsubsection": "subsubsec",
 }
 
-# Regex to find a heading command \chapter[*]?[...]{...}, capturing:
-#  1: command (chapter|section|subsection|subsubsection)
-#  2: optional star "*" (or None)
-#  3: optional short title [ ... ] (or None)
-#  4: the { ... } title text (no nested braces handling)
+# Heading command \chapter[*]?[...]{...}, capturing:
+#  cmd:   command (chapter|section|subsection|subsubsection)
+#  star:  optional star "*" (or None)
+#  short: optional short title [ ... ] (or None)
+#  title: the { ... } title text (no nested braces handling)
 HEADING_RE = re.compile(
     r"""
-    \\(chapter|section|subsection|subsubsection)   # 1: command
-    (\*)?                                         # 2: optional star
+    \\(?P<cmd>chapter|section|subsection|subsubsection)
+    (?P<star>\*)?
     \s*
-    (\[[^\]]*\])?                                 # 3: optional short title
+    (?P<short>\[[^\]]*\])?
     \s*
-    \{([^}]*)\}                                   # 4: title text (simple)
+    \{(?P<title>[^}]*)\}
     """,
     re.VERBOSE | re.MULTILINE | re.DOTALL,
 )
 
-# Regex to detect a label at the current scan position (after skipping ws/comments)
-LABEL_AHEAD_RE = re.compile(r"""\\label\{([^}]+)\}""", re.MULTILINE)
+# A \label{...}: collected across files, and looked for right after a heading
+LABEL_RE = re.compile(r"""\\label\{([^}]+)\}""", re.MULTILINE)
+
+# Whitespace and % comments (a comment consumes its newline too, if present)
+WS_AND_COMMENTS_RE = re.compile(r"(?:[ \t\r\n]+|%[^\n]*\n?)*")
+
+# Runs of anything that isn't a lowercase ASCII letter or digit
+SLUG_RE = re.compile(r"[^a-z0-9]+")
+
+# The same character class as a str.translate table, for ASCII titles
+SLUG_TABLE = {
+    c: "-" for c in range(128)
+    if not (ord("a") <= c <= ord("z") or ord("0") <= c <= ord("9"))
+}
 
+# Literal tokens checked on the raw bytes, so files without them are never decoded
+HEADING_TOKENS = (b"\\chapter", b"\\section", b"\\subsection", b"\\subsubsection")
+LABEL_TOKEN = b"\\label{"
+
+def iter_tex(root: Path):
+    """Yield every .tex file under root."""
+    return iter_files(root, lambda name: name.endswith(".tex"))
+
+@lru_cache(maxsize=8192)
 def slugify(text: str) -> str:
     """ASCII, dash-separated slug."""
-    # Normalize and strip diacritics
-    text = unicodedata.normalize("NFKD", text)
-    text = text.encode("ascii", "ignore").decode("ascii")
-    # Lowercase, collapse non-alnum to hyphens
-    text = re.sub(r"[^a-z0-9]+", "-", text.lower()).strip("-")
+    if text.isascii():
+        # Fast path (already NFKD): map non-alnum to hyphens, then collapse runs
+        text = text.lower().translate(SLUG_TABLE)
+        while "--" in text:
+            text = text.replace("--", "-")
+    else:
+        # Normalize and strip diacritics
+        text = unicodedata.normalize("NFKD", text)
+        text = text.encode("ascii", "ignore").decode("ascii")
+        # Lowercase, collapse non-alnum to hyphens
+        text = SLUG_RE.sub("-", text.lower())
+    text = text.strip("-")
     # Avoid empty slugs
     return text or "x"
 
 def skip_ws_and_comments(s: str, pos: int) -> int:
     """Advance pos over whitespace and full-line/inline % comments."""
-    n = len(s)
-    while pos < n:
-        if s[pos] in (" ", "\t", "\r", "\n"):
-            pos += 1
-            continue
-        # If at start of a comment or inline comment, skip until end of line
-        if s[pos] == "%":
-            while pos < n and s[pos] != "\n":
-                pos += 1
-            # consume the newline too (if present)
-            if pos < n and s[pos] == "\n":
-                pos += 1
-            continue
-        break
-    return pos
-
-def find_existing_label_ahead(s: str, pos: int):
-    """After skipping ws/comments, check if there's an immediate \label{...}."""
-    pos2 = skip_ws_and_comments(s, pos)
-    m = LABEL_AHEAD_RE.match(s, pos2)
-    if m:
-        return m.group(1), (m.start(), m.end())
-    return None, None
+    return WS_AND_COMMENTS_RE.match(s, pos).end()
 
 def unique_label(base: str, used: set[str]) -> str:
     """Ensure a label is unique across the whole project."""
@@ -92,17 +101,14 @@ def process_text(text: str, used_labels: set[str]) -> tuple[str, int]:
     inserted = 0
 
     for m in HEADING_RE.finditer(text):
-        cmd = m.group(1)                # chapter/section/subsection/subsubsection
-        # star = m.group(2)             # optional "*", not used but allowed
-        # short = m.group(3)            # optional [..], not used
-        title = (m.group(4) or "").strip()
+        cmd = m.group("cmd")            # chapter/section/subsection/subsubsection
+        title = (m.group("title") or "").strip()
 
         # Position right after the matched heading block
         after_heading = m.end()
 
-        # Already labeled?
-        existing_label, _span = find_existing_label_ahead(text, after_heading)
-        if existing_label:
+        # Already labeled? Check right after the heading (skipping ws/comments)
+        if LABEL_RE.match(text, skip_ws_and_comments(text, after_heading)):
             continue  # keep as is
 
         # Build a base label
@@ -119,35 +125,53 @@ def process_text(text: str, used_labels: set[str]) -> tuple[str, int]:
     out_parts.append(text[last:])
     return "".join(out_parts), inserted
 
-def collect_existing_labels(root: Path) -> set[str]:
-    """Collect already-present labels to avoid collisions across files."""
+def labels_in_file(p: Path) -> set[str]:
+    """Labels already present in one file (empty if it can't be read)."""
     used = set()
-    lab_re = re.compile(r"""\\label\{([^}]+)\}""")
-    for p in root.rglob("*.tex"):
-        try:
-            s = p.read_text(encoding="utf-8")
-        except Exception:
-            continue
-        for m in lab_re.finditer(s):
+    try:
+        with mapped(p) as data:
+            if data.find(LABEL_TOKEN) == -1:
+                return used
+            # Decoded once; like read_text, a file that isn't UTF-8 raises and is ignored
+            text = str(data, "utf-8")
+        for m in LABEL_RE.finditer(text):
             used.add(m.group(1))
+    except Exception:
+        pass
+    return used
+
+def collect_existing_labels(paths: list[Path]) -> set[str]:
+    """Collect already-present labels to avoid collisions across files."""
+    used = set()
+    # Files are independent here, so several are scanned in parallel and merged
+    for labels, _error in map_files(labels_in_file, paths):
+        used |= labels
     return used
 
 def main():
-    used_labels = collect_existing_labels(ROOT)
+    # Sorted so that label collisions resolve identically across runs
+    paths = sorted(iter_tex(ROOT))
+    used_labels = collect_existing_labels(paths)
     total_files = 0
     changed_files = 0
     inserted_total = 0
 
-    for path in ROOT.rglob("*.tex"):
+    # Sequential: every file draws from (and extends) the shared used_labels
+    for path in paths:
         total_files += 1
         try:
-            text = path.read_text(encoding="utf-8")
+            with mapped(path) as data:
+                # No headings at all: nothing to label
+                if not any(data.find(tok) != -1 for tok in HEADING_TOKENS):
+                    continue
+                # Decoded once; like read_text, a file that isn't UTF-8 raises and is skipped
+                text = str(data, "utf-8")
         except Exception as e:
             print(f"[SKIP] {path} (read error: {e})")
             continue
 
         new_text, inserted = process_text(text, used_labels)
-        if inserted > 0 and new_text != text:
+        if inserted > 0:
             path.write_text(new_text, encoding="utf-8")
             print(f"[UPDATED] {path} — inserted {inserted} label(s)")
             changed_files += 1
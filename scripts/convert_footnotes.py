@@ -2,8 +2,33 @@
 # convert_footnotes.py
 
 import re
+import sys
 from pathlib import Path
 
+from texio import map_files, mapped
+
+try:
+    import regex  # optional: recursive patterns for brace matching in C
+except ImportError:
+    regex = None
+
+# Fixed literals, located with str.find (match 'customquote' instead of 'quote')
+BEGIN_LIT = r'\begin{customquote}'
+END_LIT   = r'\end{customquote}'
+FN_LIT    = r'\footnotetext'
+FN_LEN    = len(FN_LIT)
+
+# Bytes form of BEGIN_LIT, to check mmapped files before decoding them
+BEGIN_LIT_B = BEGIN_LIT.encode('ascii')
+
+FOOTNOTEMARK_RE = re.compile(r'\\footnotemark\b')
+
+# One balanced {...} group (possessive, so unbalanced input fails fast)
+BRACED_RE = regex.compile(r'\{(?:[^{}]++|(?R))*+\}') if regex else None
+
+# Any mix of whitespace (as str.isspace) and % comments up to end of line
+WS_AND_COMMENTS_RE = re.compile(r'(?:\s+|%[^\n]*)*')
+
 def extract_braced(text: str, start: int):
     """
     Extracts content inside nested braces { ... }.
@@ -11,6 +36,12 @@ def extract_braced(text: str, start: int):
     """
     if start >= len(text) or text[start] != '{':
         raise ValueError("extract_braced: start is not at '{'")
+    if BRACED_RE is not None:
+        m = BRACED_RE.match(text, start)
+        if m is None:
+            raise ValueError("Unbalanced braces in footnotetext")
+        return text[start + 1:m.end() - 1], m.end()
+    # Fallback without the regex module: walk the braces by hand
     depth = 0
     i = start
     content_start = start + 1
@@ -29,45 +60,30 @@ def skip_ws_and_comments(text: str, idx: int) -> int:
     """
     Skips whitespace and LaTeX comments (%) to find the next meaningful character.
     """
-    n = len(text)
-    i = idx
-    while i < n:
-        if text[i].isspace():
-            i += 1
-            continue
-        if text[i] == '%':
-            while i < n and text[i] != '\n':
-                i += 1
-            continue
-        break
-    return i
+    return WS_AND_COMMENTS_RE.match(text, idx).end()
 
 def convert(tex: str) -> str:
     out = []
     i = 0
     n = len(tex)
 
-    # 1. CHANGED: Updated regex to match 'customquote' instead of 'quote'
-    begin_re = re.compile(r'\\begin\{customquote\}')
-    end_re   = re.compile(r'\\end\{customquote\}')
-
     while i < n:
-        m = begin_re.search(tex, i)
-        if not m:
+        pos = tex.find(BEGIN_LIT, i)
+        if pos == -1:
             out.append(tex[i:])
             break
 
         # copy text before the quote block starts
-        out.append(tex[i:m.start()])
+        out.append(tex[i:pos])
 
-        m_end = end_re.search(tex, m.end())
-        if not m_end:
+        end_pos = tex.find(END_LIT, pos + len(BEGIN_LIT))
+        if end_pos == -1:
             # parsing error or unclosed block; just append the rest
-            out.append(tex[m.start():])
+            out.append(tex[pos:])
             break
 
-        block_end = m_end.end()
-        block = tex[m.start():block_end]
+        block_end = end_pos + len(END_LIT)
+        block = tex[pos:block_end]
 
         # 2. REMOVED: The check for \itshape. 
         # The script previously skipped blocks without italics, 
@@ -77,8 +93,8 @@ def convert(tex: str) -> str:
         j = skip_ws_and_comments(tex, block_end)
         footnotes = []
         
-        while j < n and tex.startswith(r'\footnotetext', j):
-            j += len(r'\footnotetext')
+        while j < n and tex.startswith(FN_LIT, j):
+            j += FN_LEN
             j = skip_ws_and_comments(tex, j)
             if j >= n or tex[j] != '{':
                 break
@@ -86,36 +102,40 @@ def convert(tex: str) -> str:
             footnotes.append(content)
             j = skip_ws_and_comments(tex, after)
 
-        # Replace \footnotemark occurrences in order
-        def replace_one(mark_match, state={'idx': 0}):
-            idx = state['idx']
-            if idx < len(footnotes):
-                repl = r'\footnote{' + footnotes[idx] + r'}'
-                state['idx'] += 1
-                return repl
-            return mark_match.group(0)
-
-        # We reset state for every block to ensure counter starts at 0
-        # Note: using a mutable default argument (like previous code) is risky 
-        # across multiple calls if not careful, but within this scope 
-        # we need a fresh counter for every block.
-        class Counter:
-            idx = 0
-        
+        # Replace \footnotemark occurrences in order; a fresh iterator per
+        # block means each block starts at its own first footnotetext
+        remaining = iter(footnotes)
+
         def replace_scoped(match):
-            if Counter.idx < len(footnotes):
-                repl = r'\footnote{' + footnotes[Counter.idx] + r'}'
-                Counter.idx += 1
-                return repl
-            return match.group(0)
+            try:
+                return r'\footnote{' + next(remaining) + r'}'
+            except StopIteration:
+                return match.group(0)
 
-        block_converted = re.sub(r'\\footnotemark\b', replace_scoped, block)
+        block_converted = FOOTNOTEMARK_RE.sub(replace_scoped, block)
 
         out.append(block_converted)
         i = j  # advance past the quote block AND the consumed footnotetexts
 
     return ''.join(out)
 
+def convert_file(file_path: Path) -> str:
+    """Converts one file in place; returns the status line to print for it."""
+    with mapped(file_path) as data:
+        # No quote blocks means convert() would return the input unchanged
+        if data.find(BEGIN_LIT_B) == -1:
+            return f"Skipped {file_path.name} (no customquote blocks)"
+        tex = str(data, 'utf-8')
+    converted = convert(tex)
+    if converted == tex:
+        # Blocks without footnotes: don't touch the file (keeps its mtime)
+        return f"Unchanged {file_path.name}"
+
+    out_path = file_path.with_name(f"{file_path.name}")
+    out_path.write_text(converted, encoding='utf-8')
+
+    return f"Saved -> {out_path.name}"
+
 def main():
     # Adjust this path if your script is not in /scripts
     root_dir = Path(__file__).resolve().parent.parent 
@@ -129,17 +149,18 @@ def main():
     
     if not tex_files:
         print(f"No .tex files found in {content_dir}")
-        return
+        return 0
 
-    for file_path in tex_files:
+    failed = 0
+    for file_path, (status, error) in zip(tex_files, map_files(convert_file, tex_files)):
         print(f"Reading {file_path.name}...")
-        tex = file_path.read_text(encoding='utf-8')
-        converted = convert(tex)
-
-        out_path = file_path.with_name(f"{file_path.name}")
-        out_path.write_text(converted, encoding='utf-8')
+        if error is not None:
+            print(f"Failed {file_path.name}: {error}", file=sys.stderr)
+            failed += 1
+        else:
+            print(status)
 
-        print(f"Saved -> {out_path.name}")
+    return 1 if failed else 0
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    raise SystemExit(main())
\ No newline at end of file
@@ -22,7 +22,11 @@ Notes:
 from __future__ import annotations
 
 import re
+import sys
 from pathlib import Path
+from typing import Iterator
+
+from texio import iter_files, map_files, mapped
 
 ROOT = Path("./content")  # change if needed
 
@@ -38,11 +42,17 @@ CHAPTER_BLOCK_RE = re.compile(
     re.MULTILINE | re.VERBOSE,
 )
 
-
+# Literal pre-check before decoding; transform() runs the real regex
+SUBTITLE_TOKEN = b"\\chaptersubtitle"
 
 FILENAME_RE = re.compile(r"^chapter_(\d{2})\.tex$", re.IGNORECASE)
 
 
+def iter_chapter_files(root: Path) -> Iterator[Path]:
+    """Yield chapter_*.tex files under root, filtering names before any regex."""
+    return iter_files(root, lambda name: name.startswith("chapter_") and name.endswith(".tex"))
+
+
 def transform(text: str, chapter_num: int) -> tuple[str, int]:
     count = 0
 
@@ -61,30 +71,47 @@ def transform(text: str, chapter_num: int) -> tuple[str, int]:
     return new_text, n
 
 
+def process_file(path: Path, chapter_num: int) -> int:
+    """Transform one chapter file in place; returns the number of changes."""
+    with mapped(path) as data:
+        # No \chaptersubtitle block: nothing to transform, skip decoding
+        original = str(data, "utf-8") if data.find(SUBTITLE_TOKEN) != -1 else ""
+    new_text, changes = transform(original, chapter_num)
+
+    if changes:
+        path.write_text(new_text, encoding="utf-8")
+    return changes
+
+
 def main() -> int:
-    total_files = 0
-    changed_files = 0
+    paths = []
+    chapter_nums = []
 
-    for path in ROOT.rglob("chapter_*.tex"):
+    for path in iter_chapter_files(ROOT):
         m = FILENAME_RE.match(path.name)
         if not m:
             continue
 
-        chapter_num = int(m.group(1))  # 🔑 DROP LEADING ZERO HERE
-        total_files += 1
+        paths.append(path)
+        chapter_nums.append(int(m.group(1)))  # 🔑 DROP LEADING ZERO HERE
 
-        original = path.read_text(encoding="utf-8")
-        new_text, changes = transform(original, chapter_num)
-
-        if changes:
-            path.write_text(new_text, encoding="utf-8")
+    total_files = len(paths)
+    changed_files = 0
+    failed = 0
+
+    results = map_files(process_file, paths, chapter_nums)
+    for path, (changes, error) in zip(paths, results):
+        if error is not None:
+            print(f"[ERROR]   {path} — {error}", file=sys.stderr)
+            failed += 1
+        elif changes:
             print(f"[UPDATED] {path} — {changes} change(s)")
             changed_files += 1
         else:
             print(f"[SKIP]    {path} — no \\chaptersubtitle block found")
 
     print(f"\nDone. {changed_files}/{total_files} file(s) updated.")
-    return 0
+    return 1 if failed else 0
 
 if __name__ == "__main__":
     raise SystemExit(main())
\ No newline at end of file
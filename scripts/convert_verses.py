@@ -17,9 +17,17 @@ from __future__ import annotations
 import argparse
 import re
 import sys
+from functools import lru_cache, wraps
 from pathlib import Path
 from typing import Iterable, List, Optional, Tuple
 
+from texio import map_files, mapped
+
+try:
+    import regex  # optional: recursive patterns for brace matching in C
+except ImportError:
+    regex = None
+
 # ------------ small regex helpers (safe) ------------
 
 HSPACE_CMD_RE = re.compile(r"""\\hspace\*?\{[^}]*\}""", re.DOTALL)
@@ -32,17 +40,54 @@ SPEAKER_LINE_RE = re.compile(
 
 INDENT_LATEX = r"\quad "
 
+VERSE_CMD = r"\Verse"
+VERSE_CMD_B = VERSE_CMD.encode("ascii")
+
+
+# \hspace{...} (dropped) or a LaTeX linebreak \\ (becomes a space), in one pass.
+# Scanning left to right reads "\\hspace*{2em}" the way TeX does: a linebreak
+# followed by the text "hspace*{2em}". (The old hspace-first passes removed
+# "\hspace*{2em}" there and left a stray "\".)
+EN_CLEAN_RE = re.compile(r"""(\\hspace\*?\{[^}]*\})|\\\\""", re.DOTALL)
+WS_RE = re.compile(r"""\s+""")
+MULTISPACE_RE = re.compile(r"""\s{2,}""")
+
+# Trailing "(2.39)" / "(2.39-40)" style ref at the end of a translation
+REF_TRAILER_RE = re.compile(r"""\(\s*\d+(?:\.\d+)?(?:[–-]\d+(?:\.\d+)?)?\s*\)\s*$""")
+
+
+# Only memoize inputs shorter than this; long blocks rarely repeat
+CACHE_MAX_LEN = 2048
+
+
+def cached_for_short(fn):
+    """lru_cache fn, bypassing the cache for inputs of CACHE_MAX_LEN or more."""
+    cached = lru_cache(maxsize=2048)(fn)
+
+    @wraps(fn)
+    def wrapper(s: str) -> str:
+        return cached(s) if len(s) < CACHE_MAX_LEN else fn(s)
+
+    return wrapper
+
 
 def strip_all_hspace(s: str) -> str:
     return HSPACE_CMD_RE.sub("", s)
 
 
 def had_leading_hspace(s: str) -> bool:
-    return bool(LEADING_HSPACE_RE.search(s))
+    return bool(LEADING_HSPACE_RE.match(s))
+
+
+def clean_english_repl(m: re.Match) -> str:
+    return "" if m.group(1) else " "
 
 
 # ------------ brace-aware parsing ------------
 
+# One balanced {...} group (possessive, so unbalanced input fails fast)
+BRACED_RE = regex.compile(r"""\{(?:[^{}]++|(?R))*+\}""") if regex else None
+
 def parse_optional_bracket(s: str, i: int) -> Tuple[Optional[str], int]:
     """If s[i] == '[', parse up to matching ']' (no nesting)."""
     if i >= len(s) or s[i] != "[":
@@ -61,6 +106,13 @@ def parse_braced_arg(s: str, i: int) -> Tuple[str, int]:
     if i >= len(s) or s[i] != "{":
         raise ValueError(f"Expected '{{' at position {i}")
 
+    if BRACED_RE is not None:
+        m = BRACED_RE.match(s, i)
+        if m is None:
+            raise ValueError("Unclosed {arg} while parsing \\Verse")
+        return s[i + 1 : m.end() - 1], m.end()
+
+    # Fallback without the regex module: walk the braces by hand
     depth = 0
     j = i
     while j < len(s):
@@ -86,15 +138,18 @@ def skip_ws(s: str, i: int) -> int:
 # ------------ verse formatting helpers ------------
 
 def split_latex_lines(sa: str) -> List[str]:
-    parts = re.split(r"\s*\\\\\s*", sa.strip())
-    return [p.strip() for p in parts if p.strip()]
+    # "\\" is a fixed literal; stripping each part handles the surrounding space
+    return [p.strip() for p in sa.split("\\\\") if p.strip()]
 
 
+@cached_for_short
 def sa_to_verse_body(sa: str) -> str:
     sa = strip_all_hspace(sa)
     lines = split_latex_lines(sa)
-    wrapped = [rf"\textit{{{line}}}" for line in lines]
-    return " \\\\\n".join(wrapped)
+    if not lines:
+        return ""
+    # Close/reopen \textit in the separator: one join, no per-line strings
+    return r"\textit{" + "} \\\\\n\\textit{".join(lines) + "}"
 
 
 def extract_footnotes_brace_aware(en: str) -> Tuple[str, List[str]]:
@@ -118,19 +173,18 @@ def extract_footnotes_brace_aware(en: str) -> Tuple[str, List[str]]:
         i += 1
 
     cleaned = "".join(out)
-    cleaned = re.sub(r"\s{2,}", " ", cleaned)
+    cleaned = MULTISPACE_RE.sub(" ", cleaned)
     return cleaned, notes
 
 
+@cached_for_short
 def normalize_english(en: str) -> str:
     indent = INDENT_LATEX if had_leading_hspace(en) else ""
 
-    en = LEADING_HSPACE_RE.sub("", en)
-    en = strip_all_hspace(en)
-
-    # Turn LaTeX linebreaks into spaces (we will add our own linebreak if needed)
-    en = re.sub(r"\s*\\\\\s*", " ", en)
-    en = re.sub(r"\s+", " ", en).strip()
+    # Drop every \hspace (the leading one included) and turn LaTeX linebreaks
+    # into spaces (we will add our own linebreak if needed)
+    en = EN_CLEAN_RE.sub(clean_english_repl, en)
+    en = WS_RE.sub(" ", en).strip()
 
     # Force speaker line break after "said:" / "says:"
     m = SPEAKER_LINE_RE.match(en)
@@ -149,7 +203,7 @@ def append_ref_to_translation(en_body: str, ref: str) -> str:
         return en_body
 
     # If it already ends with a ref-like (...) don’t double-append
-    if re.search(r"\(\s*[\d]+(?:\.[\d]+)?(?:[–-][\d]+(?:\.[\d]+)?)?\s*\)\s*$", en_body):
+    if REF_TRAILER_RE.search(en_body):
         return en_body
 
     return f"{en_body} ({ref})"
@@ -180,47 +234,74 @@ def convert_content(tex: str) -> Tuple[str, int]:
     Scan through tex and convert all \Verse blocks using brace-aware parsing.
     """
     out: List[str] = []
-    i = 0
+    last = 0
     n = 0
-    while i < len(tex):
-        if tex.startswith(r"\Verse", i):
-            j = i + len(r"\Verse")
-            j = skip_ws(tex, j)
+    while True:
+        k = tex.find(VERSE_CMD, last)
+        if k == -1:
+            out.append(tex[last:])
+            break
 
-            ref = None
-            if j < len(tex) and tex[j] == "[":
-                ref, j = parse_optional_bracket(tex, j)
-                j = skip_ws(tex, j)
+        # Copy everything up to the candidate in one slice
+        out.append(tex[last:k])
 
-            # Parse {SA}{EN}
-            if j >= len(tex) or tex[j] != "{":
-                # Not a real Verse invocation; copy literally
-                out.append(tex[i])
-                i += 1
-                continue
+        j = k + len(VERSE_CMD)
+        j = skip_ws(tex, j)
 
-            sa, j = parse_braced_arg(tex, j)
+        ref = None
+        if j < len(tex) and tex[j] == "[":
+            ref, j = parse_optional_bracket(tex, j)
             j = skip_ws(tex, j)
 
-            if j >= len(tex) or tex[j] != "{":
-                # malformed; copy literally
-                out.append(tex[i])
-                i += 1
-                continue
+        # Parse {SA}{EN}
+        if j >= len(tex) or tex[j] != "{":
+            # Not a real Verse invocation; copy literally
+            out.append(tex[k : k + len(VERSE_CMD)])
+            last = k + len(VERSE_CMD)
+            continue
 
-            en, j = parse_braced_arg(tex, j)
+        sa, j = parse_braced_arg(tex, j)
+        j = skip_ws(tex, j)
 
-            out.append(format_verse_block(ref, sa, en))
-            i = j
-            n += 1
+        if j >= len(tex) or tex[j] != "{":
+            # malformed; copy literally
+            out.append(tex[k : k + len(VERSE_CMD)])
+            last = k + len(VERSE_CMD)
             continue
 
-        out.append(tex[i])
-        i += 1
+        en, j = parse_braced_arg(tex, j)
+
+        out.append(format_verse_block(ref, sa, en))
+        last = j
+        n += 1
 
     return "".join(out), n
 
 
+def convert_file(src: Path, out_path: Path) -> int:
+    """Convert one file, writing the result to out_path; returns the verse count."""
+    with mapped(src) as data:
+        # No \Verse at all: skip decoding
+        if data.find(VERSE_CMD_B) == -1:
+            converted, n = None, 0
+        else:
+            converted, n = convert_content(str(data, "utf-8"))
+
+        # Copy out before the mapping closes: out_path may name src itself,
+        # and writing a file while it is mapped truncates the mapping
+        payload = bytes(data) if n == 0 else None
+
+    if n == 0:
+        # Output equals input: copy the bytes through, or leave an in-place
+        # file untouched so its mtime doesn't trigger rebuilds
+        if not (out_path.exists() and out_path.samefile(src)):
+            out_path.write_bytes(payload)
+        return 0
+
+    out_path.write_text(converted, encoding="utf-8")
+    return n
+
+
 def iter_tex_files(inputs: List[Path]) -> Iterable[Path]:
     for p in inputs:
         if p.is_dir():
@@ -251,22 +332,33 @@ def main() -> int:
     total = 0
     changed_files = 0
 
-    for f in files:
-        original = f.read_text(encoding="utf-8")
-        converted, n = convert_content(original)
+    if args.inplace:
+        out_paths = files
+    else:
+        out_paths = [outdir / (f.stem + args.suffix) for f in files]
+
+    results = map_files(convert_file, files, out_paths)
+
+    failed = 0
+    for f, out_path, (n, error) in zip(files, out_paths, results):
+        if error is not None:
+            print(f"[ERROR] {f}: {error}", file=sys.stderr)
+            failed += 1
+            continue
+
         total += n
         if n > 0:
             changed_files += 1
 
         if args.inplace:
-            f.write_text(converted, encoding="utf-8")
             print(f"[inplace] {f}: converted {n} verse(s)")
         else:
-            out_path = outdir / (f.stem + args.suffix)
-            out_path.write_text(converted, encoding="utf-8")
             print(f"{f} -> {out_path}: converted {n} verse(s)")
 
     print(f"\nDone. Converted {total} verse(s) across {changed_files}/{len(files)} file(s).")
+    if failed:
+        print(f"{failed} file(s) failed.", file=sys.stderr)
+        return 1
     return 0
 
 
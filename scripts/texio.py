@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+texio.py
+
+Shared file access for the conversion scripts in this folder. They are run
+directly (python3 scripts/<name>.py), so this directory is on sys.path and a
+plain `from texio import ...` works.
+"""
+
+from __future__ import annotations
+
+import mmap
+import os
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from functools import partial
+from pathlib import Path
+from typing import Any, Callable, Iterator, Optional, Sequence, Tuple, Union
+
+# Starting a pool costs tens of ms, more than a small tree takes to scan
+# (this repo's frontmatter/ and content/ hold 9 and 19 files)
+POOL_MIN_FILES = 32
+
+
+def iter_files(root: Path, wanted: Callable[[str], bool]) -> Iterator[Path]:
+    """
+    Yield every file under root whose name passes wanted(name), via an
+    os.scandir walk that doesn't follow symlinked dirs. Like rglob, a missing
+    root yields nothing.
+    """
+    if not os.path.isdir(root):
+        return
+    stack = [str(root)]
+    while stack:
+        d = stack.pop()
+        with os.scandir(d) as it:
+            for e in it:
+                if e.is_dir(follow_symlinks=False):
+                    stack.append(e.path)
+                elif wanted(e.name):
+                    yield Path(e.path)
+
+
+@contextmanager
+def mapped(path: Path) -> Iterator[Union[mmap.mmap, bytes]]:
+    """
+    Map a file read-only; empty files yield b"" (mmap rejects length 0).
+
+    Search the result with .find(): on an mmap, `x in mm` only tests single
+    bytes, so a multi-byte token is never "in" it.
+    """
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            yield b""
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            yield mm
+
+
+def _capture(fn: Callable[..., Any], *args: Any) -> Tuple[Any, Optional[str]]:
+    try:
+        return fn(*args), None
+    except (OSError, ValueError) as e:
+        return None, str(e)
+
+
+def map_files(
+    fn: Callable[..., Any], *args: Sequence[Any]
+) -> list[Tuple[Any, Optional[str]]]:
+    """
+    Call fn once per file (args are parallel sequences, as for map()) and
+    return [(result, error)] in input order; an OSError/ValueError becomes that
+    file's error string instead of stopping the batch. Large batches run in a
+    process pool, so fn must be a module-level function.
+    """
+    if len(args[0]) < POOL_MIN_FILES or (os.cpu_count() or 1) < 2:
+        return [_capture(fn, *call) for call in zip(*args)]
+    with ProcessPoolExecutor() as ex:
+        return list(ex.map(partial(_capture, fn), *args, chunksize=8))